@@ -4,7 +4,7 @@ Functions accepting ROIs work with MeanRectRoi or MeanCircRoi instances.
 
 The main data collection functions are get_roidata and collect_plot_export.'''
 
-from collections import deque
+from bisect import bisect_right
 from datetime import datetime
 from itertools import count
 from math import log10, floor
@@ -40,6 +40,8 @@ if __name__ == '__main__' and __package__ is None:
     except ImportError:
         pass
 
+# buffer size in bytes for files with collected data
+_WRITE_BUFFER_SIZE = 1 << 20
 
 def reset_roi_ids():
     'make new ROIs start at id 1 again'
@@ -52,15 +54,31 @@ def save_roi(roi, path):
         filename = 'roi_{}_out.csv'.format(roi._id)
         path = os.path.join(path, filename)
 
-    with open(path, 'w') as outfile:
+    # large buffer -> few write calls for ROIs that collected a lot of data
+    with open(path, 'w', _WRITE_BUFFER_SIZE) as outfile:
         roi.to_file(outfile)
 
 def array_to_csv(filepath, array, header=''):
-    np.savetxt(filepath, array, delimiter=',', header=header, comments='')
+    'save array as csv file'
+    # np.savetxt writes row by row, so give it a large buffer, too
+    with open(filepath, 'w', _WRITE_BUFFER_SIZE) as outfile:
+        np.savetxt(outfile, array, delimiter=',', header=header, comments='')
 
 def load_roi(roi_csv_path, header_rows=11):
     'load ROI data as array from csv'
-    return np.loadtxt(roi_csv_path, skiprows=header_rows, delimiter=',')
+    # pandas is optional (and only imported here, it takes a while to import),
+    # its C parser is a lot faster than np.loadtxt
+    try:
+        import pandas as pd
+        array = pd.read_csv(
+            roi_csv_path, skiprows=header_rows, header=None).values
+    except (ImportError, ValueError):
+        # no pandas or file without data rows (pandas raises EmptyDataError,
+        # a ValueError, where np.loadtxt returns an empty array)
+        return np.loadtxt(roi_csv_path, skiprows=header_rows, delimiter=',')
+
+    # same shape np.loadtxt returns (a single row is one-dimensional)
+    return array[0] if len(array) == 1 else array
 
 def concat_arrays(arrays):
     'concats arrays vertically'
@@ -117,6 +135,12 @@ def get_roidata(videopath, roi_specs):
     if not roi_specs:
         return
 
+    # a ROI that dies before it is born would be deleted without being added
+    for roi, birth, death in roi_specs:
+        if birth > death:
+            msg = 'birth after death ({} > {} msec) for {!r}'
+            raise ValueError(msg.format(birth, death, roi))
+
     # set up a directory for results
     saveto = _set_up_result_directory(videopath)
 
@@ -129,14 +153,24 @@ def get_roidata(videopath, roi_specs):
     roi_specs = [(roi, ms_to_frame(start, cap.fps), ms_to_frame(end, cap.fps))
                  for roi, start, end in roi_specs]
 
-    # set up queues for insertion/deletion
-    insertion_order = deque(
-        sorted(roi_specs, key=lambda (roi, birth, death): birth))
-    deletion_order = deque(
-        sorted(insertion_order, key=lambda (roi, birth, death): death))
+    # set up insertion/deletion order, the cursors point to the next ROI to
+    # insert/delete (all ROIs before a cursor have already been handled)
+    insertion_order = sorted(roi_specs, key=lambda (roi, birth, death): birth)
+    deletion_order = sorted(roi_specs, key=lambda (roi, birth, death): death)
+    births = [birth for _, birth, _ in insertion_order]
+    deaths = [death for _, _, death in deletion_order]
+    insertion_cursor = deletion_cursor = 0
 
     # get last interesting frame number for progress-print
-    last_deletion_frame = min(deletion_order[-1][2], cap.frame_count)
+    last_deletion_frame = min(deaths[-1], cap.frame_count)
+
+    # frame numbers of next birth/death, the appended sentinels make sure
+    # there always is a next one (that is never reached)
+    births.append(float('inf'))
+    deaths.append(float('inf'))
+    next_birth, next_death = births[0], deaths[0]
+
+    last_progress = None
 
     while True:
         # NOTE: fast forwarding to the next birth/death (via cap.play) instead
@@ -146,17 +180,15 @@ def get_roidata(videopath, roi_specs):
         # also, skipping via setting attributes seems to be non-exact for some
         # types of videos -> see comments in image_series function
 
-        # add ROIs
-        take_screenshot = False
-        while insertion_order:
-            roi, birth, _ = insertion_order[0]
-
-            if cap.pos_frames + 1 == birth:
-                insertion_order.popleft()
+        # add ROIs born with the next frame
+        # (most frames see no births or deaths, only compare with the next)
+        take_screenshot = cap.pos_frames + 1 >= next_birth
+        if take_screenshot:
+            cursor = bisect_right(births, cap.pos_frames + 1, insertion_cursor)
+            for roi, _, _ in insertion_order[insertion_cursor:cursor]:
                 cap.add_roi(roi)
-                take_screenshot = True
-            else:
-                break
+            insertion_cursor = cursor
+            next_birth = births[cursor]
 
         # generate next frame, draw ROIs
         try:
@@ -169,34 +201,41 @@ def get_roidata(videopath, roi_specs):
             im_filename = 'frame_{}.png'.format(int(cap.pos_frames))
             frame.save(os.path.join(saveto, im_filename))
 
-        # delete rois
-        while deletion_order:
-            roi, _, death = deletion_order[0]
-            if cap.pos_frames == death:
-                deletion_order.popleft()
+        # delete rois that died with this frame
+        if cap.pos_frames >= next_death:
+            cursor = bisect_right(deaths, cap.pos_frames, deletion_cursor)
+            for roi, _, _ in deletion_order[deletion_cursor:cursor]:
                 save_roi(roi, saveto)
                 cap.delete_roi(roi._id)
-            else:
-                break
+            deletion_cursor = cursor
+            next_death = deaths[cursor]
 
         # abort if all data is already collected
-        if not cap.rois and not insertion_order:
+        if not cap.rois and insertion_cursor == len(insertion_order):
             break
 
-        # show progress
-        print '{:.1f} %\r'.format(100.0*cap.pos_frames/last_deletion_frame),
-        sys.stdout.flush()
+        # show progress (only if the printed value changes, printing and
+        # flushing on every frame is needlessly slow for long videos)
+        progress = '{:.1f} %\r'.format(
+            100.0*cap.pos_frames/last_deletion_frame)
+        if progress != last_progress:
+            print progress,
+            sys.stdout.flush()
+            last_progress = progress
 
     # save leftover rois (with death > video length)
     for roi in cap.rois.itervalues():
         save_roi(roi, saveto)
 
     # save a screenshot of all rois
-    cap.rois = {}
-    cap.pos_frames -= 1
+    # (drawn onto the last frame read - no need to decode it again, the ROIs
+    # already drawn on it are just drawn over with the same outline)
+    # NOTE: the capture is assigned to every ROI so that ROIs that were never
+    # born (and thus never registered with the capture) can be drawn, too
+    last_frame = cap.latest_frame
     for roi, _, _ in roi_specs:
-        cap.add_roi(roi)
-    last_frame = next(cap)
+        roi.cap = cap
+        roi.draw()
     last_frame.save(os.path.join(saveto, 'all_rois.png'))
 
     print '100.0 %'
@@ -219,14 +258,18 @@ def plot_roi(array, linetype='-', channels='bgr', title='ROI Plot', ax=None):
     ax.set_ylabel('mean channel intensity')
     ax.set_title(title)
 
-    for c, idx in zip('bgr', xrange(2, 5)):
-        if c in channels:
-            ax.plot(msec, array[:, idx], linetype + c)
+    # plot all selected channels with one call, then color the lines
+    colors = [c for c in 'bgr' if c in channels]
+    if colors:
+        columns = [2 + 'bgr'.index(c) for c in colors]
+        lines = ax.plot(msec, array[:, columns], linetype)
+        for line, c in zip(lines, colors):
+            line.set_color(c)
 
     ax.set_xlim(array[0][1], array[-1][1])
     return ax
 
-def collect_plot_export(videopath, roi_specs):
+def collect_plot_export(videopath, roi_specs, dpi=200):
     '''compound comfort function
 
     visualizes regions with non-overlapping lifetimes and saves helpful files
@@ -234,18 +277,16 @@ def collect_plot_export(videopath, roi_specs):
     - runs get_roidata with roi_specs (see get_roidata documentation)
     - concatenates all rows of collected data and saves to all_rois.csv
     - plots the result with horizontal lines indicating change of ROI
-    - saves the figure as an image
+    - saves the figure as an image with resolution dpi
 
     returns the axes object (the plot)
     (use plt.show() to show the plot)'''
 
-    # get numerical data
+    # get numerical data (in memory, no need to load the files just written)
     saveto = get_roidata(videopath, roi_specs)
 
     # concat data from all rois
-    region_ids = [roi._id for roi, _, _ in roi_specs]
-    roi_arrays = [load_roi(os.path.join(saveto, 'roi_{}_out.csv'.format(id_)))
-                  for id_ in region_ids]
+    roi_arrays = [roi.to_array() for roi, _, _ in roi_specs]
 
     merged = concat_arrays(roi_arrays)
     array_to_csv(os.path.join(saveto, 'all_rois.csv'), merged)
@@ -256,7 +297,7 @@ def collect_plot_export(videopath, roi_specs):
         ax.axvline(death, color='black')
 
     ax.get_figure().savefig(os.path.join(saveto, 'fig_autosave.png'),
-                            dpi=1200, bbox_inches='tight')
+                            dpi=dpi, bbox_inches='tight')
 
     print 'saved data to {}'.format(saveto)
     return ax
@@ -289,14 +330,19 @@ def image_series(videopath, start_msec, end_msec, n):
         print('adjusted start_msec to {}'.format(cap.pos_msec))
         start_msec = cap.pos_msec
 
-    for i, frame in enumerate(cap):
+    # frames that are not saved are only grabbed, not decoded
+    for i in count():
+        if not cap.grab():
+            break
+
         # current cap.pos_msec and cap.pos_frames are the values for the NEXT
-        # frame that can be retrieved with next(cap)
+        # frame that can be grabbed
         t_abs = cap.pos_msec - t_one_frame
         if t_abs > end_msec:
             break
 
         if i%n == 0:
+            frame = cap.retrieve()
             t_rel = t_abs - start_msec
             img_fname = template.format(next(imgcount), t_rel)
             frame.save(os.path.join(saveto, img_fname))
@@ -310,17 +356,31 @@ def get_frames(videopath, frames):
     # set up a directory for results
     saveto = _set_up_result_directory(videopath)
 
-    frames = set(frames)
-    last = max(frames)
+    # requested frames in order, the cursor points to the next one
+    wanted = sorted(set(frames))
+    last = wanted[-1]
+    wanted.append(float('inf')) # sentinel, never reached
+    cursor = 0
+
     cap = PyCap(videopath)
     template = 'frame_{}.png'
 
     # we don't jump around with cap.pos_frames directly because it can be
-    # inexact for some types of videos (i.e. non-avi files)
-    for frame in cap:
-        if cap.pos_frames in frames:
-            frame.save(os.path.join(saveto, template.format(cap.pos_frames)))
-        if cap.pos_frames > last:
+    # inexact for some types of videos (i.e. non-avi files) - instead, every
+    # frame is grabbed but only the requested ones are decoded
+    while cap.grab():
+        pos_frames = cap.pos_frames
+
+        # skip requested frames that cannot be reached (e.g. frame 0)
+        while wanted[cursor] < pos_frames:
+            cursor += 1
+
+        if pos_frames == wanted[cursor]:
+            frame = cap.retrieve()
+            frame.save(os.path.join(saveto, template.format(pos_frames)))
+            cursor += 1
+
+        if pos_frames >= last:
             break
 
     return saveto
@@ -26,23 +26,23 @@
 
 # standard library imports
 from __future__ import division
-from collections import OrderedDict
-import csv
+from collections import namedtuple
 from datetime import timedelta
 from functools import partial
 import math
 import os
 import re
 from ScrolledText import ScrolledText
+import struct
 from timeit import default_timer
-import tkColorChooser
-import tkFileDialog
 import Tkinter as tk
 import tkMessageBox
 import ttk
+# NOTE: csv, tkColorChooser and tkFileDialog are only needed once the user
+# exports, picks a color or selects a video -> imported where used to keep
+# start-up short
 
 # third party imports
-import cv2
 import numpy as np
 from PIL import ImageTk, Image
 
@@ -124,6 +124,12 @@ class TracedVar(tk.StringVar, object):
 
     def _validate(self):
         value = self._get()
+
+        # nothing changed, e.g. when _deny resets the value (which fires
+        # the trace again) -> no need to check again
+        if value == self._last_value:
+            return
+
         value_empty = not value
 
         if value_empty:
@@ -164,20 +170,15 @@ class TracedNumber(TracedMaxLen):
     def get(self):
         return self.prefix_conv(super(TracedNumber, self).get())
 
-    def check(self, value):
-        success = False
-
-        if super(TracedNumber, self).check(value):
-            try:
-                float(self.prefix_conv(value))
-            except ValueError:
-                pass
-            else:
-                # prevent useless leading zeros
-                if not re.match('-?0\d', value):
-                    success = True
+    # optional sign, then an integer part without useless leading zeros and
+    # an optional fractional part, or only a fractional part
+    # (no exponents, whitespace, inf or nan - float would accept those)
+    _number_re = re.compile(r'-?(?:(?:0|[1-9]\d*)(?:\.\d*)?|\.\d+)\Z')
 
-        return success
+    def check(self, value):
+        return (
+            super(TracedNumber, self).check(value) and
+            self._number_re.match(self.prefix_conv(value)) is not None)
 
 class TracedMinMaxValue(TracedNumber):
     # TODO: snapping to min/max value would be nice (if allowed by max length)
@@ -209,12 +210,30 @@ class TracedInt(TracedMinMaxValue):
         else:
             self._allowed_prefixes = tuple()
 
+        self._int_value = self._to_int(self._last_value)
+
     def check(self, value):
         # NOTE: checking float(value).is_integer() would allow trailing
         # zeros after the decimal
-        return (
-            super(TracedInt, self).check(value) and
-            self.prefix_conv(value).lstrip('+').lstrip('-').isdigit())
+        if not super(TracedInt, self).check(value):
+            return False
+
+        # the number pattern of TracedNumber allows a leading - but no +
+        conv = self.prefix_conv(value)
+        digits = conv[1:] if conv[:1] == '-' else conv
+        return digits.isdigit()
+
+    def get_int(self):
+        'returns the value as integer or None if the value is empty'
+        return self._int_value
+
+    def _to_int(self, value):
+        return int(self.prefix_conv(value)) if value else None
+
+    def _accept(self, value):
+        # parse once when the value changes, not every time it is used
+        super(TracedInt, self)._accept(value)
+        self._int_value = self._to_int(value)
 
 class DeleGetEntry(ttk.Entry, object):
     '''intended for use with traced variables:
@@ -290,11 +309,47 @@ class Log(ScrolledText, object):
     def success(self, text, prefix=None):
         self.append(text, 'success', prefix)
 
+class RoiBox(tk.Listbox, object):
+    '''listbox that displays ROI info lines and keeps track of the ids of
+    the ROIs it holds (add lines through insert_rois only)'''
+
+    def __init__(self, *args, **kwargs):
+        super(RoiBox, self).__init__(*args, **kwargs)
+        self._ids = [] # ROI id for each line
+
+    def insert_rois(self, rois):
+        '''appends info lines of rois
+        (all at once, one insert call per line is one Tcl call per line)'''
+        lines = [roi_info_line(roi) for roi in rois]
+        if lines:
+            self.insert(tk.END, *lines)
+            self._ids.extend(roi._id for roi in rois)
+
+    def delete(self, first, last=None):
+        'delete lines from first to last (inclusive) and their ROI ids'
+        first_index = self.index(first)
+        last_index = first_index if last is None else self.index(last)
+        super(RoiBox, self).delete(first, last)
+        del self._ids[first_index:last_index + 1]
+
+    def ids_at(self, indices):
+        '''returns list of ROI ids corresponding to lines at indices
+        (distinct indices, as returned by curselection)'''
+        # all lines, e.g. after "... all?" was confirmed -> copy in one go
+        if len(indices) == len(self._ids):
+            return self._ids[:]
+        return [self._ids[i] for i in indices]
+
+    def roi_count(self):
+        'number of ROIs (lines) in the box, no need to ask Tk'
+        return len(self._ids)
+
 def make_scrolled_listbox(
     frame_master, header=None, vertical=True, horizontal=True,
-    make_labelframe=False, **kws):
+    make_labelframe=False, box_class=tk.Listbox, **kws):
     '''set up scolled ListBox inside a fresh frame, return (frame, box)
-    kws are passed through to Listbox constructor'''
+    box_class is the (Listbox) class of the box, kws are passed through to
+    its constructor'''
     # TODO: (option to) hide scrollbars when not needed
 
     # set up box in frame
@@ -307,7 +362,7 @@ def make_scrolled_listbox(
             ttk.Label(frame, text=header).grid(row=0, column=0)
             boxrow = 1
 
-    box = tk.Listbox(frame, **(kws or {}))
+    box = box_class(frame, **(kws or {}))
     box.grid(row=boxrow, column=0)
 
     # set up scrollbars
@@ -331,39 +386,72 @@ def make_scrolled_listbox(
 def bgr_to_hex(b, g, r):
     '''bgr color intensities to hex rgb notation
     example: bgr_to_hex(16, 32, 64) -> #402010'''
-    return '#{:02x}{:02x}{:02x}'.format(r, g, b)
+    return '#' + _hex_bytes[r] + _hex_bytes[g] + _hex_bytes[b]
+
+# two digit hex strings for all intensities, see bgr_to_hex
+_hex_bytes = ['{:02x}'.format(i) for i in xrange(256)]
 
 def walk_widgets(root):
     'yield all descendants of a frame'
-    for child in root.winfo_children():
+    # explicit stack instead of nested generators, children are pushed in
+    # reverse so the order of the walk does not change
+    stack = root.winfo_children()[::-1]
+    while stack:
+        child = stack.pop()
         yield child
         if isinstance(child, (ttk.Frame, ttk.Labelframe)):
-            for grandchild in walk_widgets(child):
-                yield grandchild
+            stack.extend(reversed(child.winfo_children()))
 
 def time_str(timespan, unit, rounding=None):
     'turns timespan in unit to human readable string'
     if rounding is not None:
         timespan = round(timespan, rounding)
-    td = timedelta(**{unit:timespan})
-    return re.sub('(\.\d+?)0+$', r'\1', str(td)) # strip unnecessary zeros
+
+    key = (timespan, unit)
+    s = _time_strs.get(key)
+    if s is None:
+        td = timedelta(**{unit:timespan})
+        s = str(td)
+        # strip unnecessary zeros, str(td) only has a fractional part if the
+        # microseconds are nonzero so there is always a digit left after the
+        # dot
+        if '.' in s:
+            s = s.rstrip('0').rstrip('.')
+
+        # no need for LRU bookkeeping, just start over when the cache is full
+        if len(_time_strs) >= _max_time_strs:
+            _time_strs.clear()
+        _time_strs[key] = s
+
+    return s
+
+# cache for time_str, maps (timespan, unit) -> string
+_time_strs = {}
+_max_time_strs = 4096
 
 def is_avi(path):
     'checks first twelve bytes of file for valid avi header'
-    with open(path, 'rb') as f:
-        head = f.read(12)
+    # a single low level read, no need for a buffered file object
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        head = os.read(fd, 12)
+    finally:
+        os.close(fd)
 
-    RIFF_signature = '\x52\x49\x46\x46'
-    type_avi = '\x41\x56\x49\x20'
+    if len(head) != 12:
+        return False
 
-    return (
-        len(head) == 12 and
-        head[:4] == RIFF_signature and
-        head[-4:] == type_avi)
+    # RIFF header: signature, file size (little endian), form type
+    signature, _, form_type = struct.unpack('<4sI4s', head)
+    return signature == _RIFF_SIGNATURE and form_type == _AVI_FORM_TYPE
+
+# see is_avi
+_RIFF_SIGNATURE = b'RIFF'
+_AVI_FORM_TYPE = b'AVI '
 
 def check_empty(value, description=None):
-    'issues warning and raises ValueError if value is the empty string'
-    if value == '':
+    'issues warning and raises ValueError if value is the empty string or None'
+    if value == '' or value is None:
         msg = 'missing {} value'.format(description or '')
         raise ValueError(msg)
 # -----------------------------
@@ -378,110 +466,125 @@ class DummyCircRoi(roitools.CircRoi):
         'does nothing'
         pass
 
-def construct_roi_from_params(x, y):
-    'construct a ROI with center (x, y) and w.r.t. current region parameters'
-    rtype = tkvar_roitype.get()
-
-    if rtype == RECTANGULAR:
-        # get width and height
-        width_str, height_str = tkvar_width.get(), tkvar_height.get()
-        check_empty(width_str, 'region width')
-        check_empty(height_str, 'region height')
-        width, height = int(width_str), int(height_str)
-
-        # construct vertices such that (x, y) is region center
-        vertex1 = (
-            x - width//2,
-            y - height//2)
-        vertex2 = (
-            int(x + math.ceil(width/2.0)),
-            int(y + math.ceil(height/2.0)))
-
-        roi = roitools.RectRoi(vertex1, vertex2)
+def circle_out_of_frame(x, y, radius, width, height):
+    '''checks if circle with center (x, y) and radius does not fully fit into
+    a frame of size width x height'''
+    return (
+        x - radius < 0 or
+        y - radius < 0 or
+        x + radius >= width or
+        y + radius >= height)
+
+def construct_rect_roi(x, y):
+    'construct a rectangular ROI with center (x, y) w.r.t. width and height'
+    # get width and height
+    width, height = tkvar_width.get_int(), tkvar_height.get_int()
+    check_empty(width, 'region width')
+    check_empty(height, 'region height')
+
+    # construct vertices such that (x, y) is region center
+    vertex1 = (
+        x - width//2,
+        y - height//2)
+    vertex2 = (
+        int(x + math.ceil(width/2.0)),
+        int(y + math.ceil(height/2.0)))
+
+    return roitools.RectRoi(vertex1, vertex2)
+
+def construct_circ_roi(x, y):
+    'construct a circular ROI with center (x, y) w.r.t. radius'
+    radius = tkvar_radius.get_int()
+    check_empty(radius, 'region radius')
+
+    # check if this ROI can fit
+    # TODO I really need to start supporting partial circular ROIs
+    # in order to get rid of this mess
+    out_of_frame = circle_out_of_frame(
+        x, y, radius,
+        PLAYER.video.frame_width, PLAYER.video.frame_height)
+
+    if out_of_frame:
+        msg = 'region out of frame - partial circles are not supported yet'
+        raise ValueError(msg)
 
-    elif rtype == CIRCULAR:
-        radius_str = tkvar_radius.get()
-        check_empty(radius_str, 'region radius')
-        radius = int(radius_str)
-
-        # check if this ROI can fit
-        # TODO I really need to start supporting partial circular ROIs
-        # in order to get rid of this mess
-        in_bounds = not (
-            x - radius < 0 or
-            y - radius < 0 or
-            x + radius >= PLAYER.video.frame_width or
-            y + radius >= PLAYER.video.frame_height)
-
-        if in_bounds:
-            roi = DummyCircRoi((x, y), radius)
-        else:
-            msg = 'region out of frame - partial circles are not supported yet'
-            raise ValueError(msg)
+    return DummyCircRoi((x, y), radius)
 
-    return roi
+def construct_roi_from_params(x, y):
+    'construct a ROI with center (x, y) and w.r.t. current region parameters'
+    # NOTE: the entries may be empty, so check_empty is still needed
+    return ROI_CONSTRUCTORS[tkvar_roitype.get()](x, y)
 
 def roi_info_line(roi):
     '''returns simplified region info for display in listbox
     the line always starts with the ROI id'''
+    # lines of finished ROIs never change again, they are cached on the ROI
+    line = getattr(roi, '_info_line', None)
+    if line is not None:
+        return line
+
     circ = isinstance(roi, roitools.CircRoi)
     symbol = sym_white_circle if circ else sym_ballot_box
     unit = 'seconds'
     rounding = 3
 
     start = time_str(roi.start_pos_msec/1000.0, unit, rounding)
-    line = u'{}  {}  {}'.format(roi._id, symbol, start)
 
-    if hasattr(roi, 'end_pos_msec'):
+    if not roi._active:
         end = time_str(roi.end_pos_msec/1000.0, unit, rounding)
-        line += u' {} {}'.format(sym_arrow_right, end)
+        line = _finished_line_template.format(
+            roi._id, symbol, start, sym_arrow_right, end)
+        roi._info_line = line
+    else:
+        line = _active_line_template.format(roi._id, symbol, start)
 
     return line
 
-def roi_info_dict(roi):
-    'creates ordered dict with information on roi'
-    # keys of info dict
-    keys = (
-        'type', 'radius', 'center_x', 'center_y', 'vertex1_x', 'vertex1_y',
-        'vertex2_x', 'vertex2_y', 'start_pos_msec', 'end_pos_msec',
-        'start_pos_frames', 'end_pos_frames', 'constructor')
-
-    # keys with identical ROI attribute names
-    attrs = [
-        'start_pos_msec', 'end_pos_msec',
-        'start_pos_frames', 'end_pos_frames']
-
-    info = OrderedDict.fromkeys(keys, '')
-    type_ = CIRCULAR if isinstance(roi, roitools.CircRoi) else RECTANGULAR
-    info['type'] = type_
-    info['constructor'] = repr(roi)
-
-    if type_ == CIRCULAR:
-        attrs.append('radius')
-        info['center_x'] = roi.center[0]
-        info['center_y'] = roi.center[1]
+# templates for roi_info_line: id, symbol, start[, arrow, end]
+_active_line_template = u'{}  {}  {}'
+_finished_line_template = u'{}  {}  {} {} {}'
+
+# row of exported information on a ROI, see roi_info_row
+RoiInfo = namedtuple(
+    'RoiInfo',
+    'type radius center_x center_y vertex1_x vertex1_y vertex2_x vertex2_y '
+    'start_pos_msec end_pos_msec start_pos_frames end_pos_frames constructor')
+
+def roi_info_row(roi):
+    '''creates RoiInfo tuple with information on roi
+    (cells that do not apply to the type of the roi are empty strings)'''
+    if isinstance(roi, roitools.CircRoi):
+        type_, radius = CIRCULAR, getattr(roi, 'radius', '')
+        center_x, center_y = roi.center
+        vertex1_x = vertex1_y = vertex2_x = vertex2_y = ''
     else:
-        info['vertex1_x'] = roi.vertex1[0]
-        info['vertex1_y'] = roi.vertex1[1]
-        info['vertex2_x'] = roi.vertex2[0]
-        info['vertex2_y'] = roi.vertex2[1]
-
-    for attr in attrs:
-        info[attr] = getattr(roi, attr, '')
-
-    return info
+        type_, radius = RECTANGULAR, ''
+        center_x = center_y = ''
+        vertex1_x, vertex1_y = roi.vertex1
+        vertex2_x, vertex2_y = roi.vertex2
+
+    return RoiInfo(
+        type_, radius, center_x, center_y,
+        vertex1_x, vertex1_y, vertex2_x, vertex2_y,
+        getattr(roi, 'start_pos_msec', ''), getattr(roi, 'end_pos_msec', ''),
+        getattr(roi, 'start_pos_frames', ''),
+        getattr(roi, 'end_pos_frames', ''),
+        repr(roi))
 # -----------------------------
 
 # --- CLASSES FOR PLAYBACK ---
 class RoiVideo(roitools.RoiCap):
     '''modified/extended RoiCap for use in this GUI
-    (keeps track of a brightness offset and yields RGB frames)'''
+    (keeps track of a brightness offset and redraws active ROIs only)'''
 
     # NOTE: I'd like to keep this from initiating interactions with widgets,
     # if possible
 
     def __init__(self, *args, **kwargs):
         self._brightness_offset = 0
+        self._background = None # brightness adjusted frame without ROIs
+        self._display = None # reusable buffer for background + ROIs
+        self._active_rois = [] # unfinished ROIs in the order they were added
         super(RoiVideo, self).__init__(*args, **kwargs)
 
     def add_roi(self, roi):
@@ -489,32 +592,63 @@ class RoiVideo(roitools.RoiCap):
         super(RoiVideo, self).add_roi(roi)
         roi.start_pos_msec = self.pos_msec
         roi.start_pos_frames = self.pos_frames
-
-    def _bgr_to_rgb(self, frame):
-        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, frame)
+        roi._active = True # cheaper to check than hasattr(roi, 'end_...')
+        self._active_rois.append(roi)
+
+    def finish_roi(self, roi_id, end_pos_msec, end_pos_frames):
+        'add ending timestamps to an active ROI, returns the ROI'
+        roi = self.rois[roi_id]
+        roi.end_pos_msec = end_pos_msec
+        roi.end_pos_frames = end_pos_frames
+        roi._active = False
+        self._active_rois.remove(roi)
+        return roi
+
+    def delete_roi(self, roi_id):
+        'delete ROI by ID'
+        roi = self.rois[roi_id]
+        super(RoiVideo, self).delete_roi(roi_id)
+        if roi in self._active_rois:
+            self._active_rois.remove(roi)
 
     def draw_active_rois(self):
-        for roi in self.rois.viewvalues():
-            if not hasattr(roi, 'end_pos_frames'):
-                roi.draw()
+        for roi in self._active_rois:
+            roi.draw()
+
+    def _update_background(self):
+        'apply brightness offset to a copy of the unmodified current frame'
+        # unmodified frame (BGR) as read by VideoCapture - without an offset
+        # it can be used as is because redraw never draws on the background
+        background = self.latest_frame_original
+
+        if self._brightness_offset != 0:
+            background = background.copy()
+            background.adjust_brightness(self._brightness_offset)
+
+        self._background = background
 
     def redraw(self):
-        'apply brightness offset to current frame and redraw rois'
+        '''redraw rois on the brightness adjusted current frame
+        (the background only needs to be recomputed when a new frame is read
+        or the brightness offset changes, not when ROIs change)'''
         # NOTE: the order is important here!
 
-        # get copy of unmodified frame (BGR) as read by VideoCapture
-        frame = self.latest_frame_original.copy()
+        # nothing to draw -> show the background as is, it is never drawn on
+        if not self._active_rois:
+            self.latest_frame = self._background
+            return
 
-        # apply brightness offset before drawing ROIs
-        frame.adjust_brightness(self._brightness_offset)
+        # get copy of brightness adjusted frame (BGR) without ROIs
+        # (the frame size never changes, so the buffer can be reused)
+        if self._display is None:
+            self._display = np.empty_like(self._background)
+        frame = self._display
+        np.copyto(frame, self._background)
 
-        # redraw rois before converting from BGR to RGB
+        # redraw rois (the frame stays BGR, see VideoPlayer._show_frame)
         self.latest_frame = frame
         self.draw_active_rois()
 
-        # convert to RGB
-        self._bgr_to_rgb(frame)
-
     @property
     def brightness_offset(self):
         return self._brightness_offset
@@ -527,7 +661,17 @@ class RoiVideo(roitools.RoiCap):
 
         # when the offset is set, it needs to be applied to a copy of the
         # unmodified current frame, else information can be lost
-        self._brightness_offset = np.clip(value, -255, 255)
+        # (clamped to a plain int - np.clip would return a numpy scalar,
+        # which would also become the key of the look-up table cache)
+        value = max(-255, min(255, int(value)))
+
+        # nothing to do if the offset did not change (e.g. brightness is
+        # already at its limit or has already been reset)
+        if value == self._brightness_offset:
+            return
+
+        self._brightness_offset = value
+        self._update_background()
         self.redraw()
 
     def next(self):
@@ -537,6 +681,7 @@ class RoiVideo(roitools.RoiCap):
         # -> adjust code as needed if program is extended to collect ROI data
 
         self.latest_frame_original = vidtools.PyCap.next(self)
+        self._update_background()
         self.redraw()
 
         return self.latest_frame
@@ -566,19 +711,31 @@ class VideoPlayer(object):
         self._backwards = False # flag for backwards play
         self._target_delay = None # optimal delay between frames when playing
         self._sch_play_delay = None # current scheduling delay when playing
-        self._last_play_show = None # last time of frame shown during playback
+        self._next_show = None # time the next frame is due during playback
         self._after_handle = None # return value of self.tk_root.after
+        self._dirty = True # flag for frames that have not been shown yet
+        self._redraw_pending = False # flag for ROI changes, see refresh
+        self._frozen = False # flag for leaving the canvas alone
         self._canvas = None # canvas that shows image
+        self._image = None # PhotoImage on canvas, frames are pasted into it
         self._window = None # window that holds canvas
 
         self.pause()
         self._update_pos_vars()
 
+    # forward jumps of at most this many frames are performed by grabbing
+    # (not decoding) the frames in between instead of seeking - default for
+    # _max_grab_frames, which load_video sets to about one second of video
+    # (a typical keyframe distance)
+    _min_grab_frames = 30
+    _max_grab_frames = _min_grab_frames
+
     def __init__(self, tk_root=tk_root):
         self.tk_root = tk_root
-        self._idle_delay = 50 # approximate delay between redraws when paused
         self.tkvar_pos_frames = tk.DoubleVar() # current frame
         self.tkvar_pos_time = tk.StringVar() # current time as string
+        self._pos_frames_shown = None # value last set to tkvar_pos_frames
+        self._pos_secs_shown = None # seconds last set to tkvar_pos_time
         self._re_init()
 
     def _update_pos_vars(self):
@@ -589,11 +746,21 @@ class VideoPlayer(object):
             frame = 1
             msec = 0
 
-        self.tkvar_pos_frames.set(frame)
-        self.tkvar_pos_time.set(time_str(msec/1000.0, 'seconds', rounding=0))
+        # only touch the variables (and their widgets) on change, the time
+        # label only changes once per second
+        if frame != self._pos_frames_shown:
+            self.tkvar_pos_frames.set(frame)
+            self._pos_frames_shown = frame
+
+        secs = round(msec/1000.0)
+        if secs != self._pos_secs_shown:
+            self.tkvar_pos_time.set(time_str(secs, 'seconds'))
+            self._pos_secs_shown = secs
 
     def next(self):
         frame = next(self.video)
+        self._redraw_pending = False # reading a frame redraws the ROIs
+        self._mark_dirty()
         self._update_pos_vars()
         return frame
 
@@ -606,12 +773,25 @@ class VideoPlayer(object):
         # zero, subsequent calls to read fail to return the frame
 
         if self.video.frame_count > 1:
-            self.video.pos_frames = frame
-            self.video.pos_frames -= 1
+            # short jumps ahead: grabbing is cheaper than a seek (which
+            # decodes from the last keyframe) and exact for all video types
+            # (falls back to seeking if grabbing fails at the end of video)
+            delta = frame - self.video.pos_frames
+            grabbed = (
+                0 < delta <= self._max_grab_frames and
+                all(self.video.grab() for _ in xrange(int(delta) - 1)))
+
+            if not grabbed:
+                self.video.pos_frames = frame
+                self.video.pos_frames -= 1
+
             next(self)
 
     def refresh(self):
-        self.video.redraw()
+        '''redraw the ROIs on the current frame before it is shown next
+        (several refreshes before that only cause one redraw)'''
+        self._redraw_pending = True
+        self._mark_dirty()
 
     def pause(self):
         self._paused = True
@@ -619,9 +799,9 @@ class VideoPlayer(object):
     def play(self):
         'resume playback in the current direction'
         if self._paused:
-            now = default_timer()
-            self._last_play_show = now
+            self._next_show = default_timer()
         self._paused = False
+        self._wake()
 
     def toggle_play(self):
         'pauses or resumes playback'
@@ -644,9 +824,11 @@ class VideoPlayer(object):
 
     def brightness_adjust(self, increment):
         self.video.brightness_offset += increment
+        self._mark_dirty()
 
     def brightness_reset(self):
         self.video.brightness_offset = 0
+        self._mark_dirty()
 
     def load_video(self, path):
         'load video from filename - expects to be called from unloaded state'
@@ -668,16 +850,19 @@ class VideoPlayer(object):
             else:
                 # video seems to be fine
                 # TODO consider maximum delay for videos with very low fps
-                self._target_delay = max(int(1000.0/video.fps), 1) # msec
-                self._sch_play_delay = self._target_delay # initial value
+                # (not rounded, only the scheduled delays have to be ints)
+                self._target_delay = max(1000.0/video.fps, 1) # msec
+                self._sch_play_delay = int(self._target_delay) # initial
+                self._max_grab_frames = max(
+                    self._min_grab_frames, int(round(video.fps)))
                 self.video = video
                 self.videoname = os.path.basename(path)
                 self._set_up_window()
-                self._schedule_next_frame()
+                self._wake()
 
     def unload_video(self):
         'unload video - expects to be called from loaded state'
-        self.tk_root.after_cancel(self._after_handle)
+        self._cancel_scheduled()
         self.video.release()
         self._window.destroy()
         self._re_init()
@@ -697,12 +882,45 @@ class VideoPlayer(object):
             width=self.video.frame_width, **no_border)
         self._canvas.grid(row=0, column=0)
 
+        # one image (and canvas item) for all frames, see _show_frame
+        size = (int(self.video.frame_width), int(self.video.frame_height))
+        self._image = ImageTk.PhotoImage('RGB', size)
+        self._canvas.create_image(0, 0, anchor=tk.NW, image=self._image)
+
         # let close eject video
         self._window.protocol("WM_DELETE_WINDOW", cb_eject_video)
 
         # let space bar pause/resume
         self._window.bind('<space>', lambda _: self.toggle_play())
 
+    def _mark_dirty(self):
+        'remember that the current frame needs to be shown again'
+        self._dirty = True
+        self._wake()
+
+    def _wake(self):
+        '''make sure the current frame gets shown soon
+        (the paused player does not poll, it is woken up on changes)'''
+        if self.video and not self._frozen and self._after_handle is None:
+            self._after_handle = self.tk_root.after_idle(
+                self._schedule_next_frame)
+
+    def _cancel_scheduled(self):
+        'cancel the next scheduled call of _schedule_next_frame'
+        if self._after_handle is not None:
+            self.tk_root.after_cancel(self._after_handle)
+            self._after_handle = None
+
+    def _freeze(self):
+        'stop showing frames until _unfreeze is called'
+        self._frozen = True
+        self._cancel_scheduled()
+
+    def _unfreeze(self):
+        'resume showing frames after _freeze'
+        self._frozen = False
+        self._wake()
+
     def _manage_playback_scheduling(self):
         '''to be called directly after showing a frame during playback!
         performs actions to recalculate the current _sch_play_delay'''
@@ -713,23 +931,34 @@ class VideoPlayer(object):
         # (which is fine for planning regions of interest - maybe use another
         # software to watch the latest blockbuster)
 
+        # every frame is due _target_delay after the previous one was due,
+        # so time spent decoding and showing and the rounding of delays
+        # don't accumulate
         now = default_timer()
-        actual_delay = (now - self._last_play_show)*1000.0 # msec
-        self._last_play_show = now
+        self._next_show += self._target_delay/1000.0
 
-        adjusted = (self._target_delay/actual_delay)*self._sch_play_delay
-        self._sch_play_delay = max(int(round(adjusted)), 1)
+        # fell behind (e.g. slow decoding)? -> don't rush to catch up
+        if self._next_show < now:
+            self._next_show = now
 
-    def _schedule_next_frame(self):
-        'pause or play the video by scheduling the next frame to show'
-        delay = self._idle_delay # when unloaded or paused
+        delay = (self._next_show - now)*1000.0 # msec
+        self._sch_play_delay = max(int(round(delay)), 1)
 
-        if self.video:
+    def _schedule_next_frame(self):
+        '''show the current frame if needed and, if playing, schedule the
+        next frame to show (a paused player is woken up through _wake)'''
+        # NOTE: self._after_handle is only updated at the very end, so calls
+        # to _wake from in here don't schedule a second call of this method
+        delay = None # when unloaded or paused
+        video = self.video # this method runs once per frame, save lookups
+
+        if video:
             # if playing, get the next frame and set
             # a roughly appropriate waiting time between frames
             if not self._paused:
-                if self._backwards:
-                    self.video.pos_frames -= 2 # clips to zero
+                backwards = self._backwards
+                if backwards:
+                    video.pos_frames -= 2 # clips to zero
 
                 try:
                     next(self)
@@ -737,12 +966,18 @@ class VideoPlayer(object):
                     self.pause()
 
                 # reached beginning of video while playing backwards? -> stop
-                if self._backwards and self.video.pos_frames == 1:
+                if backwards and video.pos_frames == 1:
                     self.pause()
 
             # update canvas
-            # (even when paused because ROIs/brightness may have changed)
-            self._show_frame(self.video.latest_frame)
+            # (only if the frame changed, i.e. a new frame has been read or
+            # ROIs/brightness have changed)
+            if self._dirty:
+                if self._redraw_pending:
+                    video.redraw()
+                    self._redraw_pending = False
+                self._show_frame(video.latest_frame)
+                self._dirty = False
 
             # adjust delay (needs to be done after showing the frame!)
             # NOTE: time _manage_playback_scheduling takes itself is ignored
@@ -750,15 +985,23 @@ class VideoPlayer(object):
                 self._manage_playback_scheduling()
                 delay = self._sch_play_delay
 
-        # reschedule
-        self._after_handle = self.tk_root.after(
-            delay, self._schedule_next_frame)
+        # reschedule if playing
+        if delay is None:
+            self._after_handle = None
+        else:
+            self._after_handle = self.tk_root.after(
+                delay, self._schedule_next_frame)
 
     def _show_frame(self, frame):
-        'convert frame to PhotoImage and put on canvas'
-        image = ImageTk.PhotoImage(image=Image.fromarray(frame))
-        self._image = image # prevent garbage collection!
-        self._canvas.create_image(0, 0, anchor=tk.NW, image=image)
+        'paste (BGR) frame into the PhotoImage on the canvas'
+        # NOTE: creating a new PhotoImage and canvas item per frame would
+        # also pile up canvas items (and the images they hold on to)
+
+        # PIL reads the BGR bytes directly, no need to convert to RGB first
+        height, width = frame.shape[:2]
+        image = Image.frombuffer(
+            'RGB', (width, height), frame, 'raw', 'BGR', 0, 1)
+        self._image.paste(image)
 
 class TouchScreen(tk.Canvas, object):
     # TODO no rectangle selection outside of canvas!
@@ -813,7 +1056,7 @@ class TouchScreen(tk.Canvas, object):
     def _lclick(self, event):
         'freeze the player and create a modifiable rectangle on the canvas'
         # make player leave the canvas alone
-        tk_root.after_cancel(self._player._after_handle)
+        self._player._freeze()
 
         # create rectangle
         x, y = self._start_x, self._start_y = self._canvas_xy(event)
@@ -839,7 +1082,7 @@ class TouchScreen(tk.Canvas, object):
         self._re_init()
 
         # unfreeze player
-        self._player._schedule_next_frame()
+        self._player._unfreeze()
 
     def _add_roi_helper(self, roi):
         'helper for adding roi to associated player after mouse action'
@@ -852,7 +1095,7 @@ class TouchScreen(tk.Canvas, object):
             roitools.BaseRoi._next_id -= 1
         else:
             self._player.refresh()
-            tk_active_roi_box.insert(tk.END, roi_info_line(roi))
+            tk_active_roi_box.insert_rois([roi])
             tk_log.append('started region {}'.format(roi._id))
 # ----------------------------
 
@@ -863,6 +1106,9 @@ FRAMES = 'frames'
 SECONDS = 'seconds'
 CIRCULAR = 'circular'
 RECTANGULAR = 'rectangular'
+ROI_CONSTRUCTORS = {
+    CIRCULAR: construct_circ_roi,
+    RECTANGULAR: construct_rect_roi}
 ttk_DISABLED = 'disabled'
 ttk_NORMAL = '!{}'.format(ttk_DISABLED)
 # --------------------------
@@ -912,12 +1158,14 @@ def cb_eject_video(confirm=True):
     videoname = PLAYER.videoname
     PLAYER.unload_video()
     tkvar_videoname.set('')
-    tk_log.append('ejected "{}"'.format(os.path.basename(videoname)))
+    tk_log.append('ejected "{}"'.format(videoname)) # already a base name
 
 # VIDEO SELECTION
 def cb_select_video():
     'ejects previous video and loads video through PLAYER, then updates GUI'
 
+    import tkFileDialog
+
     # get file from user
     path = tkFileDialog.askopenfilename()
     basename = os.path.basename(path) if path else ''
@@ -969,25 +1217,39 @@ def cb_bar_set_frame(event):
     'sets video position according to clicked position on progress bar'
     # NOTE: the problem here is that BETWEEN the mousebutton-release-event
     # and the execution of this function, the bar can be re-set by reading
-    # from PLAYER.tkvar_pos_frames - which means calling tk_bar.get will
-    # not return the position the bar was just clicked to
+    # from PLAYER.tkvar_pos_frames - which means the bar's current value
+    # is not necessarily the position the bar was just clicked to
     #
-    # solution:
-    # 1. the bar is disabled by default
-    # (events are still registered, this function is still executed)
-    # 2. in this callback: enable bar
-    # 3. generate click event with same x, y coordinates -> bar moves
-    # 4. disable bar again
-    # 5. NOW get the bar's position and set the video frame
+    # solution: the bar is disabled by default (events are still registered,
+    # this function is still executed) and the value is computed from the
+    # click coordinates by the bar itself, i.e. with tk_bar.get(x, y) -
+    # no synthetic click event and no state changes are needed
+
+    # NOTE: bursts of clicks are coalesced - only the last clicked position
+    # is sought to, _BAR_SEEK_DELAY milliseconds after the last click
+
+    global _bar_seek_handle
 
     if PLAYER.video:
-        tk_bar.state([ttk_NORMAL])
-        tk_bar.event_generate('<Button-1>', x=event.x, y=event.y)
-        tk_bar.state([ttk_DISABLED])
+        frame = round(tk_bar.get(event.x, event.y))
+
+        if _bar_seek_handle is not None:
+            tk_root.after_cancel(_bar_seek_handle)
+        _bar_seek_handle = tk_root.after(
+            _BAR_SEEK_DELAY, _bar_seek, frame)
+
+def _bar_seek(frame):
+    'helper for cb_bar_set_frame, sets the video position (if it changed)'
+    global _bar_seek_handle
+    _bar_seek_handle = None
 
-        frame = round(tk_bar.get())
+    # video ejected meanwhile or clicked the current position? -> don't seek
+    if PLAYER.video and frame != PLAYER.video.pos_frames:
         PLAYER.set_position(frame)
 
+_BAR_SEEK_DELAY = 20 # msec
+_bar_seek_handle = None # return value of tk_root.after, see cb_bar_set_frame
+
 # CLASSICAL CONTROLS (play, pause, stop)
 cb_play_forwards = PLAYER.play_forwards
 cb_play_backwards = PLAYER.play_backwards
@@ -1077,41 +1339,58 @@ cb_brightness_up = partial(PLAYER.brightness_adjust, brightness_increment)
 cb_brightness_down = partial(PLAYER.brightness_adjust, -brightness_increment)
 cb_brightness_reset = PLAYER.brightness_reset
 
+def regions_msg(verb, ids):
+    "log message for an action on ROIs, e.g. 'deleted regions 1, 2'"
+    plural = 's' if len(ids) > 1 else ''
+    return '{} region{} {}'.format(verb, plural, ', '.join(map(str, ids)))
+
 # ROI DELETION
-def selected_ids(listbox):
-    # NOTE: parsing ROI ids from the beginning of listbox strings is straight
-    # forward but mixes presentation and model -> on next refactoring consider
-    # Listbox subclass internally keeping track of ROIs being held
-    'returns list of ROI ids corresponding to selected listbox items'
-    lines = (listbox.get(i) for i in listbox.curselection())
-    return [int(line.split(' ', 1)[0]) for line in lines]
-
-def del_rois(listbox):
-    'delete selected ROIs from listbox'
-    ids = selected_ids(listbox)
+def delete_lines(listbox, indices):
+    '''deletes lines at ascending indices from listbox, with one delete call
+    per run of consecutive indices'''
+    # all lines? (indices are unique) -> no need to look for runs
+    if len(indices) == listbox.size():
+        listbox.delete(0, tk.END)
+        return
+
+    runs = []
+    for i in indices:
+        if runs and i == runs[-1][1] + 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+
+    # back to front so the indices of the remaining runs stay valid
+    for first, last in reversed(runs):
+        listbox.delete(first, last)
+
+def del_rois(listbox, indices=None):
+    '''delete selected ROIs from listbox
+    (or the ROIs at indices, e.g. the ones that have just been exported)'''
+    if indices is None:
+        indices = listbox.curselection()
 
     # no selection but box not empty?
-    if not ids and listbox.get(0, tk.END):
+    if not indices and listbox.roi_count():
         msg = 'No regions selected. Delete all?'
         if tkMessageBox.askyesno('Delete all?', msg):
-            listbox.selection_set(0, tk.END)
-            ids = selected_ids(listbox)
+            indices = range(listbox.roi_count())
 
     # no work -> abort
-    if not ids:
+    if not indices:
         return
 
-    # delete selected lines in listbox
-    for line_index in reversed(listbox.curselection()):
-        listbox.delete(line_index)
+    ids = listbox.ids_at(indices)
+
+    # delete lines in listbox
+    delete_lines(listbox, indices)
 
     # delete from capture
     for id_ in ids:
-        del PLAYER.video.rois[id_]
+        PLAYER.video.delete_roi(id_)
 
     # log
-    msg = 'deleted region{} {}'.format(
-        's'*(len(ids) > 1), ', '.join(map(str, ids)))
+    msg = regions_msg('deleted', ids)
     tk_log.append(msg)
 
 def cb_del_active_rois():
@@ -1126,22 +1405,22 @@ def cb_finish_rois():
     'move selected active ROIs to finished ROIs'
     # TODO: structure in parts similar to cb_delete_rois function -> refactor?
     # (also, this function got pretty long)
-    ids = selected_ids(tk_active_roi_box)
+    indices = tk_active_roi_box.curselection()
 
     # no selection but box not empty? -> ask to finish all
-    if not ids and tk_active_roi_box.get(0, tk.END):
+    if not indices and tk_active_roi_box.roi_count():
         msg = 'No regions selected. Finish all?'
         if tkMessageBox.askyesno('Finish all?', msg):
-            tk_active_roi_box.selection_set(0, tk.END)
-            ids = selected_ids(tk_active_roi_box)
+            indices = range(tk_active_roi_box.roi_count())
 
     # no work -> abort
-    if not ids:
+    if not indices:
         return
 
+    ids = tk_active_roi_box.ids_at(indices)
+
     # delete selected lines in active roi listbox
-    for i in reversed(tk_active_roi_box.curselection()):
-        tk_active_roi_box.delete(i)
+    delete_lines(tk_active_roi_box, indices)
 
     # mark ROIs as finished by giving them ending timestamps
     end_msec = PLAYER.video.pos_msec
@@ -1149,9 +1428,7 @@ def cb_finish_rois():
     swap = tkvar_swap_times.get()
 
     for id_ in ids:
-        roi = PLAYER.video.rois[id_]
-        roi.end_pos_msec = end_msec
-        roi.end_pos_frames = end_frame
+        roi = PLAYER.video.finish_roi(id_, end_msec, end_frame)
 
         # switch start/end if option set
         if swap and roi.end_pos_frames < roi.start_pos_frames:
@@ -1161,34 +1438,38 @@ def cb_finish_rois():
                 roi.start_pos_frames, roi.end_pos_frames)
 
     # insert lines into finished roi box
-    for id_ in ids:
-        roi = PLAYER.video.rois[id_]
-        tk_finished_roi_box.insert(tk.END, roi_info_line(roi))
+    rois = PLAYER.video.rois
+    tk_finished_roi_box.insert_rois([rois[id_] for id_ in ids])
 
     # log
-    msg = 'finished region{} {}'.format(
-        's'*(len(ids) > 1), ', '.join(map(str, ids)))
+    msg = regions_msg('finished', ids)
     tk_log.append(msg)
 
     # redraw frame
     PLAYER.refresh()
 
 # ROI EXPORTING
+_EXPORT_BUFFER_SIZE = 1 << 20 # bytes, buffer for the exported csv file
+
 def cb_export():
     'export finished ROIs'
-    ids = selected_ids(tk_finished_roi_box)
+    indices = tk_finished_roi_box.curselection()
 
-    # no selection but box not empty? -> ask to finish all
-    if not ids and tk_finished_roi_box.get(0, tk.END):
+    # no selection but box not empty? -> ask to export all
+    if not indices and tk_finished_roi_box.roi_count():
         msg = 'No regions selected. Export all?'
         if tkMessageBox.askyesno('Export all?', msg):
-            tk_finished_roi_box.selection_set(0, tk.END)
-            ids = selected_ids(tk_finished_roi_box)
+            indices = range(tk_finished_roi_box.roi_count())
+
+    ids = tk_finished_roi_box.ids_at(indices)
 
     # no work -> abort
     if not ids:
         return
 
+    import csv
+    import tkFileDialog
+
     # ask the user for a filename
     ext = '.csv'
     filename = tkFileDialog.asksaveasfilename(
@@ -1199,26 +1480,28 @@ def cb_export():
     if not filename:
         return
 
-    # build lines for csv file
-    row_dicts = [roi_info_dict(PLAYER.video.rois[id_]) for id_ in ids]
+    # lines for csv file, built one by one while writing
+    rois = PLAYER.video.rois
+    rows = (roi_info_row(rois[id_]) for id_ in ids)
 
-    # write csv file
+    # write csv file (through a large buffer, few write calls)
     try:
-        with open(filename, 'w') as out:
-            writer = csv.DictWriter(out, fieldnames=row_dicts[0].keys())
-            writer.writeheader()
-            writer.writerows(row_dicts)
+        with open(filename, 'w', _EXPORT_BUFFER_SIZE) as out:
+            # NOTE: a hand-made ','.join would need quoting for the
+            # constructor column (its repr contains commas)
+            writer = csv.writer(out)
+            writer.writerow(RoiInfo._fields)
+            writer.writerows(rows)
     except EnvironmentError as e:
         tk_log.error(str(e))
     else:
         # log
-        msg = 'exported region{} {}'.format(
-            's'*(len(ids) > 1), ', '.join(map(str, ids)))
+        msg = regions_msg('exported', ids)
         tk_log.success(msg)
 
         # delete if option set
         if tkvar_del_exported.get():
-            del_rois(tk_finished_roi_box)
+            del_rois(tk_finished_roi_box, indices)
 
 # COLOR CHOOSING
 def cb_select_color():
@@ -1226,6 +1509,7 @@ def cb_select_color():
     current_bgr = roitools.BaseRoi.active_color
     current_rgb = current_bgr[::-1]
 
+    import tkColorChooser
     new_rgb, _ = tkColorChooser.askcolor(current_rgb)
 
     if new_rgb:
@@ -1447,7 +1731,8 @@ tk_roi_frame.grid(row=6, column=0)
 # frame and box for active ROIs
 box_kws = dict(
     frame_master=tk_roi_frame, make_labelframe=True, horizontal=False,
-    selectmode=tk.MULTIPLE, exportselection=False, height=8)
+    selectmode=tk.MULTIPLE, exportselection=False, height=8,
+    box_class=RoiBox)
 tk_active_roi_frame, tk_active_roi_box = make_scrolled_listbox(
     header='active regions - start', **box_kws)
 tk_active_roi_box['width'] = 25
@@ -1534,8 +1819,10 @@ tk_log.grid(row=7, column=0)
 
 # NOTE getting all widgets here assumes they are static - if widgets are added
 # or removed at runtime, walk_widgets needs to be called at runtime as needed
-ALL_WIDGETS = set(walk_widgets(tk_root_frame))
-ALL_WIDGETS.add(tk_root_frame)
+# (a list keeps the construction order, so the GUI is set up the same way on
+# every start)
+ALL_WIDGETS = [tk_root_frame]
+ALL_WIDGETS.extend(walk_widgets(tk_root_frame))
 
 # this is a (crude?) implementation of cascading grid configuration:
 # the three dictionaries map widget classes, styles and individual widgets to
@@ -1588,13 +1875,12 @@ widget_grid_params[tk_circular_label] = (
 
 # apply grid parameters
 for widget in ALL_WIDGETS:
-    try:
-        style = widget['style']
-    except tk.TclError:
-        style = None
+    # only ttk widgets have a style option
+    style = widget['style'] if isinstance(widget, ttk.Widget) else None
 
-    kwargs = class_grid_params.get(widget.__class__, {}).copy()
-    kwargs.update(style_grid_params.get(style, {}))
+    # the class parameters are copied by dict, no separate copy needed
+    kwargs = dict(class_grid_params.get(widget.__class__, {}),
+        **style_grid_params.get(style, {}))
     kwargs.update(widget_grid_params.get(widget, {}))
 
     widget.grid_configure(**kwargs)
@@ -1619,30 +1905,46 @@ tk_root.resizable(False, False)
 # -------------------------
 
 # --- ENABLING/DISABLING WIDGETS ---
-def set_widget_states(widgets, state=tk.NORMAL):
-    '''given an iterable of widgets, tries to set state to tk.NORMAL or
-    tk.DISABLED and suppresses errors if that's not possible'''
+def split_stateful_widgets(widgets):
+    '''given an iterable of widgets, returns a pair (tk widgets, ttk widgets)
+    for use with set_widget_states - tk widgets without a state option are
+    left out'''
+    tk_widgets, ttk_widgets = [], []
     for widget in widgets:
-        try:
-            widget['state'] = state
-        except tk.TclError:
-            # deal with ttk widgets
-            ttk_state = ttk_NORMAL if state == tk.NORMAL else ttk_DISABLED
+        if isinstance(widget, ttk.Widget):
+            ttk_widgets.append(widget)
+        elif 'state' in widget.keys():
+            tk_widgets.append(widget)
+
+    return tk_widgets, ttk_widgets
+
+def set_widget_states(widgets, state=tk.NORMAL):
+    '''given a pair (tk widgets, ttk widgets) as returned by
+    split_stateful_widgets, sets state to tk.NORMAL or tk.DISABLED'''
+    tk_widgets, ttk_widgets = widgets
+    ttk_state = ttk_NORMAL if state == tk.NORMAL else ttk_DISABLED
+
+    for widget in tk_widgets:
+        widget['state'] = state
+    for widget in ttk_widgets:
+        widget.state([ttk_state])
 
-            try:
-                widget.state([ttk_state])
-            except (AttributeError, tk.TclError):
-                pass
+# NOTE: the widgets are sorted into tk and ttk widgets once here, so no
+# errors need to be caught when the states are set
 
 # function for state: no video
 set_widget_states_unloaded = partial(
-    set_widget_states, ALL_WIDGETS - {tk_select_button}, tk.DISABLED)
+    set_widget_states,
+    split_stateful_widgets(
+        w for w in ALL_WIDGETS if w is not tk_select_button), tk.DISABLED)
 
 # function for state: video loaded
 # NOTE disabling the bar is a kludge to make setting the video position work
 # properly while playing - see cb_bar_set_frame for details
 set_widget_states_loaded = partial(
-    set_widget_states, ALL_WIDGETS - {tk_bar}, tk.NORMAL)
+    set_widget_states,
+    split_stateful_widgets(w for w in ALL_WIDGETS if w is not tk_bar),
+    tk.NORMAL)
 # ----------------------------------
 
 # --- TEST SECTION ---
@@ -7,7 +7,6 @@
 import csv
 from collections import namedtuple
 from datetime import datetime
-from itertools import izip, product
 
 import numpy as np
 
@@ -23,8 +22,10 @@ class RoiCap(PyCap):
 
     def __init__(self, video, title=None):
         'RoiCap(path or device id) -> RoiCap object'
-        self.rois = {}
+        self.rois = {} # maps ROI id -> ROI
         self.latest_frame = None # latest frame read from capture
+        self._integral = None # integral image of latest_frame, see rect_mean
+        self._use_integral = None # rect_mean's decision for latest_frame
         super(RoiCap, self).__init__(video, title)
 
     def add_roi(self, roi):
@@ -44,7 +45,8 @@ class RoiCap(PyCap):
     def _notify_rois(self):
         'notify all ROIs on change'
         for roi in self.rois.viewvalues():
-            roi.notified()
+            if not roi.deaf:
+                roi.notified()
 
         # drawing must take place after all ROIs collected data
         self.draw_rois()
@@ -59,9 +61,54 @@ class RoiCap(PyCap):
         # remember to show the frame AFTER drawing, remember not to
         # draw on the frame before notifying all observers
 
+    # the integral image is only used if the rectangles of the MeanRectRois
+    # cover at least this many frames (computing it writes three float64 sums
+    # per pixel of the whole frame, averaging a rectangle reads its pixels)
+    _integral_min_coverage = 2.0
+
+    def _integral_pays_off(self):
+        'True if averaging from the integral image is cheaper, see rect_mean'
+        area = sum(
+            (roi.end_x - roi.st_x)*(roi.end_y - roi.st_y)
+            for roi in self.rois.viewvalues()
+            if isinstance(roi, MeanRectRoi) and not roi.deaf)
+        height, width = self.latest_frame.shape[:2]
+        return area >= self._integral_min_coverage*height*width
+
+    def rect_mean(self, rect_slice):
+        '''rect_mean((row slice, column slice)) -> per channel means
+
+        mean intensities of the (unmasked) rectangle of latest_frame that
+        rect_slice selects: usually averaged directly, but if many/large
+        rectangles are observed, the integral image of the frame is computed
+        once and every rectangle costs four look-ups regardless of its size'''
+        if self._use_integral is None:
+            self._use_integral = self._integral_pays_off()
+        if not self._use_integral:
+            return self.latest_frame[rect_slice].mean_bgr()
+
+        if self._integral is None:
+            self._integral = self.latest_frame.integral()
+        integral = self._integral
+
+        # clip the slices the same way slicing the frame would
+        height, width = self.latest_frame.shape[:2]
+        rows, columns = rect_slice
+        st_y, end_y, _ = rows.indices(height)
+        st_x, end_x, _ = columns.indices(width)
+
+        sums = (integral[end_y, end_x] - integral[st_y, end_x] -
+                integral[end_y, st_x] + integral[st_y, st_x])
+        area = max(end_y - st_y, 0)*max(end_x - st_x, 0)
+
+        # empty rectangle -> nan, like the mean of an empty slice
+        return sums/area if area else sums*np.nan
+
     def next(self):
         'get next frame, notify ROIs, draw ROIs'
         self.latest_frame = super(RoiCap, self).next()
+        self._integral = None # belongs to the previous frame
+        self._use_integral = None
         self._notify_rois()
         return self.latest_frame
 
@@ -76,6 +123,11 @@ class BaseRoi(object):
     active_color = Color(green=255, red=0, blue=0)
     passive_color = Color(green=200, red=200, blue=200)
 
+    # font parameters for draw_id - not exactly flexible, but these
+    # parameters look ok-ish for now...
+    _id_font = 1 # HERSHEY_PLAIN
+    _id_font_scale = 0.9
+
     def __init__(self, vertex1, vertex2, description='N/A'):
         '''BaseRoi((x1, y1), (x2, y2)[, description])
         -> BaseRoi object
@@ -101,9 +153,15 @@ class BaseRoi(object):
         center_y = self.st_y + (self.end_y - self.st_y)/2
         self.center = (center_x, center_y)
 
+        # id and its position don't change -> prepare them for draw_id
+        self._id_text = str(self._id)
+        self._id_pos = (center_x - 4, center_y + 4)
+
         # increment ends by one to get correct values for slicing
         self.end_x += 1
         self.end_y += 1
+        self._rect_slice = (
+            slice(self.st_y, self.end_y), slice(self.st_x, self.end_x))
 
         # compute the mask
         self.mask = self.compute_mask()
@@ -153,8 +211,7 @@ class BaseRoi(object):
     def get_rect(self):
         'slice rectangular ROI from observed frame (does not apply mask)'
         # NOTE: applying boolean mask to 2D array flattens array!
-        frame = self.cap.latest_frame
-        return frame[self.st_y:self.end_y, self.st_x:self.end_x]
+        return self.cap.latest_frame[self._rect_slice]
 
     def collect(self):
         '''collect data from observed capture or return None if nothing of
@@ -168,12 +225,9 @@ class BaseRoi(object):
 
     def draw_id(self):
         'draws ROI id on observed frame at center of rectangle'
-        # not exactly flexible, but these parameters look ok-ish for now...
-        font = 1 # HERSHEY_PLAIN
-        font_scale = 0.9
-        pos = self.center[0] - 4, self.center[1] + 4
         self.cap.latest_frame.put_text(
-            str(self._id), pos, font, font_scale, self.roicolor)
+            self._id_text, self._id_pos, self._id_font, self._id_font_scale,
+            self.roicolor)
 
     def draw_outline(self):
         'outline the actual ROI area (respecting masks) on observed frame'
@@ -234,15 +288,10 @@ class CircRoi(BaseRoi):
         dx = self.end_x - self.st_x
         dy = self.end_y - self.st_y
 
-        mask = np.zeros((dx, dy), dtype=np.bool)
-        macenter = (dx/2, dy/2)
-
-        # NOTE: this takes long if radius is large
-        for x, y in product(xrange(dx), xrange(dy)):
-            if (x - macenter[0])**2 + (y - macenter[1])**2 <= self.radius_sq:
-                mask[y][x] = True
-
-        return mask
+        # row (y) and column (x) coordinates relative to the mask's center,
+        # broadcasting them gives the (dy, dx) mask in one go
+        y, x = np.ogrid[:dy, :dx]
+        return (x - dx//2)**2 + (y - dy//2)**2 <= self.radius_sq
 
     def __str__(self):
         return 'CircRoi(center={}, radius={})'.format(self.center, self.radius)
@@ -259,6 +308,11 @@ class CircRoi(BaseRoi):
     def contains(self, point):
         'contains((x, y)) -> bool'
         x, y = point
+
+        # points outside of the bounding square can't be in the circle
+        if not (self.st_x <= x < self.end_x and self.st_y <= y < self.end_y):
+            return False
+
         dx = x - self.center[0]
         dy = y - self.center[1]
         return dx**2 + dy**2 <= self.radius_sq
@@ -270,24 +324,25 @@ MeanBgrRecord = namedtuple('MeanBgrRecord', 'pos_frames pos_msec color')
 def _collect_mean_bgr(instance, use_mask):
     '''helper for MeanCircRoi.collect and MeanRectRoi.collect -
     returns MeanBgrRecord or None'''
-    rect = instance.get_rect()
-
-    blue, green, red = [
-        getattr(rect, color) for color in ('blue', 'green', 'red')]
-
+    # masked regions: all channels are averaged in one pass over the
+    # (interleaved) region, rectangles: the capture decides whether to do
+    # the same or to look the sums up in an integral image, see rect_mean
     if use_mask:
-        blue, green, red = [
-            array[instance.mask] for array in (blue, green, red)]
-
-    blue_avg, green_avg, red_avg = [
-        float(np.mean(array)) for array in (blue, green, red)]
-
-    col = Color(blue_avg, green_avg, red_avg)
+        col = Color(*instance.get_rect().mean_bgr(instance._cv_mask))
+    else:
+        col = Color(*[
+            float(mean) for mean in instance.cap.rect_mean(
+                instance._rect_slice)])
 
     # test if col should be ignored
+    # (all channels differ less than delta_ig <=> the largest difference does)
     if instance.collected:
-        lastcol = instance.collected[-1].color
-        if all(abs(x - y) < instance.delta_ig for x, y in izip(col, lastcol)):
+        blue, green, red = col
+        last_blue, last_green, last_red = instance.collected[-1].color
+        delta = max(
+            abs(blue - last_blue), abs(green - last_green),
+            abs(red - last_red))
+        if delta < instance.delta_ig:
             return None
 
     return MeanBgrRecord(instance.cap.pos_frames, instance.cap.pos_msec, col)
@@ -303,8 +358,21 @@ def _to_file_mean_bgr(instance, datafile, maskfile):
         'green_avg', 'red_avg'))
     datafile.write('HEADER_END\n')
 
-    rows = ((fp, ms, b, g, r) for fp, ms, (b, g, r) in instance.collected)
-    writer.writerows(rows)
+    # the flat rows are taken from one array instead of being unpacked record
+    # by record, tolist gives Python floats -> same formatting as before
+    writer.writerows(_to_array_mean_bgr(instance).tolist())
+
+def _to_array_mean_bgr(instance):
+    '''helper for MeanCircRoi.to_array and MeanRectRoi.to_array'''
+    # collected is a list of (pos_frames, pos_msec, (b, g, r)) records,
+    # fill one contiguous float array column-wise from the transposed records
+    data = np.empty((len(instance.collected), 5))
+    if instance.collected:
+        pos_frames, pos_msec, colors = zip(*instance.collected)
+        data[:, 0] = pos_frames
+        data[:, 1] = pos_msec
+        data[:, 2:] = colors
+    return data
 
 class MeanCircRoi(CircRoi):
     '''circular region of interest that collects the mean blue, green and red
@@ -323,6 +391,10 @@ class MeanCircRoi(CircRoi):
         super(MeanCircRoi, self).__init__(center, radius, description)
         self.delta_ig = delta_ig
 
+        # the uint8 mask cv2 expects, see _collect_mean_bgr (booleans are
+        # stored as single bytes 0 and 1, so this is just another view)
+        self._cv_mask = self.mask.view(np.uint8)
+
     def __repr__(self):
         return "MeanCircRoi({}, {}, '{}', {})".format(
             self.center, self.radius, self.description, self.delta_ig)
@@ -339,6 +411,11 @@ class MeanCircRoi(CircRoi):
         'write info and collected data to datafile, save mask to maskfile'
         _to_file_mean_bgr(instance=self, datafile=datafile, maskfile=maskfile)
 
+    def to_array(self):
+        '''collected data as array with rows
+        (pos_frames, pos_msec, blue_avg, green_avg, red_avg)'''
+        return _to_array_mean_bgr(instance=self)
+
 class MeanRectRoi(RectRoi):
     '''rectangular region of interest that collects the mean blue, green and red
     intensities in the observed region for each frame'''
@@ -362,3 +439,8 @@ class MeanRectRoi(RectRoi):
     def to_file(self, datafile):
         'write info and collected data to datafile'
         _to_file_mean_bgr(instance=self, datafile=datafile, maskfile=None)
+
+    def to_array(self):
+        '''collected data as array with rows
+        (pos_frames, pos_msec, blue_avg, green_avg, red_avg)'''
+        return _to_array_mean_bgr(instance=self)
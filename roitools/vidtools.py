@@ -49,6 +49,31 @@ def pause():
     'wait indefinitely, to be used after showing a frame'
     cv2.waitKey(0)
 
+# look-up tables used by Frame.adjust_brightness, maps offset -> table
+_brightness_luts = {}
+
+def _brightness_lut(offset):
+    '''returns (cached) three channel look-up table for HSV images that adds
+    offset to the value channel (saturating) and leaves hue and saturation
+    unchanged'''
+    lut = _brightness_luts.get(offset)
+    if lut is None:
+        identity = np.arange(256)
+        value = np.clip(identity + offset, 0, 255)
+        lut = np.dstack((identity, identity, value)).astype(np.uint8)
+        _brightness_luts[offset] = lut
+    return lut
+
+def _cap_property(name):
+    '''property that reads capture property name directly, for properties
+    that are read on every frame (skips __getattr__)'''
+    prop_id = _prop2id[name]
+
+    def get(self):
+        return self._cv2cap.get(prop_id)
+
+    return property(get, doc='capture property {}'.format(name))
+
 class PyCap(object):
     '''Python adapter/facade for cv2.VideoCapture
 
@@ -59,6 +84,12 @@ class PyCap(object):
 
     - iteration yields Frame objects (numpy arrays with extra methods)'''
 
+    # NOTE: setting these still goes through __setattr__
+    pos_msec = _cap_property('pos_msec')
+    pos_frames = _cap_property('pos_frames')
+    fps = _cap_property('fps')
+    frame_count = _cap_property('frame_count')
+
     def __init__(self, video, title=None):
         'PyCap(path) -> PyCap object'
         if not os.path.isfile(video):
@@ -114,6 +145,21 @@ class PyCap(object):
             raise StopIteration
         return Frame(array, self.title)
 
+    def grab(self):
+        '''advance to the next frame without decoding it
+        returns True on success, False if there is no next frame
+
+        use retrieve to decode the grabbed frame if it is needed - this is
+        much cheaper than calling next for frames that are skipped anyway'''
+        return self._cv2cap.grab()
+
+    def retrieve(self):
+        'decode and return the frame the capture was last advanced to by grab'
+        success, array = self._cv2cap.retrieve()
+        if not success:
+            raise StopIteration
+        return Frame(array, self.title)
+
     def release(self):
         self._cv2cap.release()
 
@@ -146,16 +192,17 @@ class PyCap(object):
         if start is not None:
             self.pos_msec = start
 
-        if stop is None:
-            stop = np.nan
+        # no stop -> the position does not need to be read for every frame
+        check_stop = stop is not None
+        get, pos_msec_id = self._cv2cap.get, _prop2id['pos_msec']
 
         self.open()
 
         for frame in self:
             # if the video lies about its true fps, i.e. fps has been upscaled
-            # by repeat-last-frame instructions, the self.pos_msec > stop
+            # by repeat-last-frame instructions, the pos_msec > stop
             # check will overshoot the destination time
-            if self.pos_msec > stop:
+            if check_stop and get(pos_msec_id) > stop:
                 break
 
             if delay > 0:
@@ -234,9 +281,25 @@ class Frame(np.ndarray):
         offset < 0: brightness down'''
 
         if offset != 0:
-            h, s, v = cv2.split(cv2.cvtColor(self, cv2.COLOR_BGR2HSV, self))
-            cv2.add(v, offset, v)
-            cv2.cvtColor(cv2.merge((h, s, v)), cv2.COLOR_HSV2BGR, self)
+            # the look-up table only touches the value channel, so there is
+            # no need to split and merge the channels
+            cv2.cvtColor(self, cv2.COLOR_BGR2HSV, self)
+            cv2.LUT(self, _brightness_lut(offset), self)
+            cv2.cvtColor(self, cv2.COLOR_HSV2BGR, self)
+
+    def mean_bgr(self, mask=None):
+        '''mean_bgr([mask]) -> (blue, green, red) mean intensities
+
+        mask: optional uint8 array of the frame's height and width, only
+        pixels where it is nonzero are averaged (all channels in one pass)'''
+        return cv2.mean(self, mask)[:3]
+
+    def integral(self):
+        '''integral() -> array of shape (height + 1, width + 1, channels)
+
+        integral image (summed area table) of the frame, sums are float64 so
+        they can't overflow for large frames'''
+        return cv2.integral(self, sdepth=cv2.CV_64F)
 
     def show(self):
         '''shows the frame